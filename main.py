@@ -1,14 +1,928 @@
-import tkinter as tk
+import time
+
+# Reference point for --profile-startup: taken when this module starts loading, so the
+# interpreter's own startup (before any of main.py runs) is not included
+_IMPORT_START = time.perf_counter()
+
+import argparse
+import collections
+import contextlib
 import math
+import os
 import re
+import signal
+import sys
+
+# tkinter and NumPy are imported on first use, so headless modes (--eval) never load tkinter
+# and the GUI only pays for NumPy once matrix mode is used
+tk = None
+np = None
+
+# Matrices with more elements than this are summarised in the display and shown in the viewer
+MATRIX_INLINE_LIMIT = 16
+# Matrices with more elements than this are truncated (with '...') in the viewer
+MATRIX_VIEW_THRESHOLD = 400
+MATRIX_VIEW_EDGEITEMS = 5
+# Matrix functions and the names they are exposed under in expressions
+MATRIX_FUNCTIONS = ['inv', 'det', 'solve', 'transpose']
+
+
+def _import_tkinter():
+    """Import tkinter on first use."""
+    global tk
+    if tk is None:
+        import tkinter
+        tk = tkinter
+    return tk
+
+
+def _import_numpy():
+    """Import NumPy on first use, raising a ValueError with a readable message if it is not installed."""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ValueError("Matrix mode requires NumPy")
+        np = numpy
+    return np
+
+
+def _format_number(value):
+    """Format a scalar result the same way the display always has."""
+    formatted = '{:.10f}'.format(value).rstrip('0').rstrip('.')
+    return formatted or "0"
+
+
+class Matrix:
+    """
+    Wraps a NumPy array so the calculator operators have linear-algebra meaning:
+    '*' between matrices/vectors is the matrix product, '^' is the matrix power,
+    and scalars are applied element-wise.
+    """
+    __slots__ = ('array',)
+
+    def __init__(self, array):
+        if array.ndim not in (1, 2):
+            raise ValueError("Only vectors and 2-D matrices are supported")
+        self.array = array
+
+    def __getstate__(self):
+        return self.array
+
+    def __setstate__(self, array):
+        # Matrices unpickled from an evaluation worker: this process may not have loaded NumPy yet
+        _import_numpy()
+        self.array = array
+
+    @staticmethod
+    def wrap(value):
+        """Wrap an array result, unwrapping 0-d results (e.g. vector dot products) to floats."""
+        if np.ndim(value) == 0:
+            return float(value)
+        return Matrix(value)
+
+    @staticmethod
+    def _operand(value):
+        return value.array if isinstance(value, Matrix) else value
+
+    @property
+    def is_square(self):
+        return self.array.ndim == 2 and self.array.shape[0] == self.array.shape[1]
+
+    def __add__(self, other):
+        return Matrix.wrap(self.array + Matrix._operand(other))
+
+    def __radd__(self, other):
+        return Matrix.wrap(other + self.array)
+
+    def __sub__(self, other):
+        return Matrix.wrap(self.array - Matrix._operand(other))
+
+    def __rsub__(self, other):
+        return Matrix.wrap(other - self.array)
+
+    def __mul__(self, other):
+        if isinstance(other, Matrix):
+            return Matrix.wrap(self.array @ other.array)
+        return Matrix.wrap(self.array * other)
+
+    def __rmul__(self, other):
+        return Matrix.wrap(other * self.array)
+
+    def __truediv__(self, other):
+        if isinstance(other, Matrix):
+            raise TypeError("cannot divide by a matrix, use inv()")
+        if other == 0:
+            raise ZeroDivisionError("division by zero")
+        return Matrix.wrap(self.array / other)
+
+    def __rtruediv__(self, other):
+        raise TypeError("cannot divide by a matrix, use inv()")
+
+    def __pow__(self, exponent):
+        if not self.is_square:
+            raise ValueError("Matrix power needs a square matrix")
+        if isinstance(exponent, Matrix) or not float(exponent).is_integer():
+            raise ValueError("Matrix power needs an integer exponent")
+        return Matrix(np.linalg.matrix_power(self.array, int(exponent)))
+
+    def __neg__(self):
+        return Matrix(-self.array)
+
+    def __pos__(self):
+        return self
+
+    def describe(self):
+        """Short shape description, e.g. '3x3 matrix' or '5-vector'."""
+        if self.array.ndim == 1:
+            return f"{self.array.shape[0]}-vector"
+        return "{}x{} matrix".format(*self.array.shape)
+
+    def format_inline(self):
+        """Single-line literal form, which can be typed back into an expression."""
+        if self.array.ndim == 1:
+            return '[' + ','.join(_format_number(x) for x in self.array) + ']'
+        return '[' + ','.join('[' + ','.join(_format_number(x) for x in row) + ']' for row in self.array) + ']'
+
+    def format_view(self):
+        """Multi-line form for the matrix viewer; large matrices are truncated with '...'."""
+        return np.array2string(self.array, threshold=MATRIX_VIEW_THRESHOLD, edgeitems=MATRIX_VIEW_EDGEITEMS,
+                               precision=6, suppress_small=True, max_line_width=200)
+
+
+def _matrix_operand(value, func_name):
+    if not isinstance(value, Matrix):
+        raise TypeError(f"{func_name}() expects a matrix")
+    return value.array
+
+
+def _square_matrix_operand(value, func_name):
+    if not isinstance(value, Matrix) or not value.is_square:
+        raise ValueError(f"{func_name}() needs a square matrix")
+    return value.array
+
+
+def matrix_inv(m):
+    return Matrix(np.linalg.inv(_square_matrix_operand(m, 'inv')))
+
+
+def matrix_det(m):
+    # Overflow is reported as OverflowError below rather than as a NumPy warning on stderr
+    with np.errstate(over='ignore'):
+        value = float(np.linalg.det(_square_matrix_operand(m, 'det')))
+    if math.isinf(value):
+        raise OverflowError("determinant too large")
+    return value
+
+
+def matrix_solve(a, b):
+    return Matrix(np.linalg.solve(_square_matrix_operand(a, 'solve'), _matrix_operand(b, 'solve')))
+
+
+def matrix_transpose(m):
+    return Matrix(_matrix_operand(m, 'transpose').T)
+
+
+def matrix_from_list(values):
+    """Build a Matrix from an evaluated list literal such as [pi, 2**3]."""
+    _import_numpy()
+    try:
+        array = np.array(values, dtype=float)
+    except ValueError:
+        raise ValueError("Matrix rows must have the same length")
+    return Matrix(array)
+
+
+def _parse_numeric_matrix_literal(text):
+    """
+    Fast path for purely numeric literals like [[1,2],[3,4]]: split the text and let
+    NumPy convert it, instead of compiling a large list display with eval().
+    """
+    if text.startswith('[['):
+        return Matrix(np.array([row.split(',') for row in text[2:-2].split('],[')], dtype=float))
+    return Matrix(np.array(text[1:-1].split(','), dtype=float))
+
+
+def extract_matrix_literals(expr):
+    """
+    Replace each purely numeric top-level [...] literal with a placeholder name bound to
+    the parsed Matrix, so long matrix data never goes through the expression rewriting
+    regexes. Other literals, e.g. [pi, 2^3], are wrapped in mat(...) for eval().
+    Returns the new expression and a dict of placeholder names to matrices.
+    """
+    if '[' not in expr and ']' not in expr:
+        return expr, {}
+    _import_numpy()
+
+    parts = []
+    literals = {}
+    depth = 0
+    start = 0
+    last_end = 0
+    for match in re.finditer(r'[\[\]]', expr):
+        if match.group() == '[':
+            if depth == 0:
+                start = match.start()
+            depth += 1
+            continue
+        depth -= 1
+        if depth < 0:
+            raise SyntaxError("unbalanced brackets")
+        if depth == 0:
+            text = expr[start:match.end()]
+            try:
+                name = f"_m{len(literals)}"
+                literals[name] = _parse_numeric_matrix_literal(text)
+                parts.append(expr[last_end:start] + name)
+            except ValueError:
+                parts.append(expr[last_end:start] + f"mat({text})")
+            last_end = match.end()
+    if depth != 0:
+        raise SyntaxError("unbalanced brackets")
+    parts.append(expr[last_end:])
+    return ''.join(parts), literals
+
+
+# Factorials up to this n are kept in a table that is extended as larger ones are needed
+FACTORIAL_TABLE_LIMIT = 1000
+# Total size of the larger exact results (factorials and falling products) kept in the LRU cache
+FACTORIAL_CACHE_BYTES = 32 * 1024 * 1024
+
+
+def _factorial_argument(n):
+    """Check a factorial argument, accepting integral floats such as 5.0 (e.g. from variables)."""
+    if isinstance(n, float) and n.is_integer():
+        n = int(n)
+    if not isinstance(n, int):
+        raise ValueError("factorial() only accepts integral values")
+    if n < 0:
+        raise ValueError("factorial() not defined for negative values")
+    return n
+
+
+def _range_product(low, high):
+    """Product of the integers low..high (1 for an empty range), multiplied by binary splitting."""
+    if high - low < 16:
+        return math.prod(range(low, high + 1))
+    mid = (low + high) // 2
+    return _range_product(low, mid) * _range_product(mid + 1, high)
+
+
+class SpecialFunctions:
+    """
+    Exact factorials for safe_dict, memoized between evaluations.
+
+    Factorials up to FACTORIAL_TABLE_LIMIT come from a table that is extended incrementally.
+    Larger factorials and the falling products used by fact_quotient() are kept in an LRU
+    cache bounded by the byte size of the cached integers, and a new large factorial is
+    computed from the nearest smaller cached one when that is cheaper than math.factorial.
+    The float functions (sqrt, ln, sin, ...) stay direct math calls, which cost less than
+    a cache lookup. hits and misses count the results served from the table or cache and
+    those that had to be computed.
+    """
+
+    def __init__(self, max_cache_bytes=FACTORIAL_CACHE_BYTES):
+        self.table = [1]  # table[n] == n!
+        self.cache = collections.OrderedDict()  # n or (low, high) -> exact result, least recently used first
+        self.cache_bytes = 0
+        self.max_cache_bytes = max_cache_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, key):
+        value = self.cache.get(key)
+        if value is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return value
+
+    def _remember(self, key, value):
+        size = (value.bit_length() + 7) // 8
+        if size > self.max_cache_bytes:
+            return
+        self.cache[key] = value
+        self.cache_bytes += size
+        while self.cache_bytes > self.max_cache_bytes:
+            _, evicted = self.cache.popitem(last=False)
+            self.cache_bytes -= (evicted.bit_length() + 7) // 8
+
+    def fact(self, n):
+        """n! as an exact integer."""
+        n = _factorial_argument(n)
+        if n < len(self.table):
+            self.hits += 1
+            return self.table[n]
+        if n <= FACTORIAL_TABLE_LIMIT:
+            self.misses += 1
+            value = self.table[-1]
+            for k in range(len(self.table), n + 1):
+                value *= k
+                self.table.append(value)
+            return value
+
+        value = self._cached(n)
+        if value is not None:
+            return value
+        # Extending the closest smaller known factorial beats math.factorial while the gap is within n/4
+        base = max((k for k in self.cache if isinstance(k, int) and k < n), default=len(self.table) - 1)
+        if n - base <= n // 4:
+            base_value = self.table[base] if base < len(self.table) else self.cache[base]
+            value = base_value * _range_product(base + 1, n)
+        else:
+            value = math.factorial(n)
+        self._remember(n, value)
+        return value
+
+    def falling_product(self, n, k):
+        """n!/k! for n >= k, computed as (k+1)*(k+2)*...*n without either factorial."""
+        if n < len(self.table):
+            self.hits += 1
+            return self.table[n] // self.table[k]
+        value = self._cached((k + 1, n))
+        if value is None:
+            value = _range_product(k + 1, n)
+            self._remember((k + 1, n), value)
+        return value
+
+    def fact_quotient(self, n, *divisors):
+        """
+        n!/(d1!*d2!*...), as rewritten from fact(n)/fact(d) and fact(n)/(fact(d1)*fact(d2)).
+        Exact integer when the quotient is whole, otherwise a float like the division it replaces.
+        """
+        n = _factorial_argument(n)
+        divisors = sorted((_factorial_argument(d) for d in divisors), reverse=True)
+        # Cancel the largest divisor against n! and divide by the rest
+        largest, rest = divisors[0], divisors[1:]
+        denominator = math.prod(self.fact(d) for d in rest)
+        if largest <= n:
+            numerator = self.falling_product(n, largest)
+        else:
+            numerator = 1
+            denominator *= self.falling_product(largest, n)
+        quotient, remainder = divmod(numerator, denominator)
+        return quotient if remainder == 0 else numerator / denominator
+
+
+# Shared by every evaluation in this process. Each pool worker gets its own copy when it is forked,
+# so its LRU cache only holds what that worker computed and is lost when the worker is replaced.
+special_functions = SpecialFunctions()
+
+
+# Numbers (including exponents such as 1e-05) and names in an expression; only names are captured
+_TOKEN_PATTERN = re.compile(r'\d[\d.]*(?:[eE][+\-]?\d+)?|([a-zA-Z_][a-zA-Z0-9_]*)')
+# A number that is not part of a name such as log10, for the implicit multiplication rules
+_NUMBER = r'(?<![a-zA-Z0-9_])(?:\d*\.\d+|\d+)(?:[eE][+\-]?\d+)?'
+# fact(a)/(fact(b)*fact(c)) and fact(a)/fact(b), not raised to a power
+_FACT_QUOTIENT_PATTERNS = [
+    (re.compile(r'fact\(([^(),]+)\)/\(fact\(([^(),]+)\)\*fact\(([^(),]+)\)\)(?!\*\*)'), 'fact_quotient({},{},{})'),
+    (re.compile(r'fact\(([^(),]+)\)/fact\(([^(),]+)\)(?!\*\*)'), 'fact_quotient({},{})'),
+]
+# Allowed function names that eval can safely call through safe_dict
+ALLOWED_FUNCTIONS = ['sqrt', 'fact', 'sin', 'cos', 'tan', 'log10', 'ln', 'abs', 'pi', 'math'] + MATRIX_FUNCTIONS
+
 
-print("--- Program Start ---")
+def expression_names(expr):
+    """Return the set of names (functions and variables) used in an expression."""
+    return {name for name in _TOKEN_PATTERN.findall(expr) if name}
+
+
+def validate_expression(expr, variables=()):
+    """
+    Validates the expression to ensure it only contains allowed characters
+    before evaluation. This is a crucial security measure for eval().
+    Names other than the allowed functions must be in variables.
+    """
+    allowed_chars_pattern = r"^[0-9+\-*/().^%πa-zA-Z\[\],]*$"
+
+    # Check for disallowed characters first
+    if not re.match(allowed_chars_pattern, expr):
+        return False, "Error: Invalid characters in expression"
+
+    for name in expression_names(expr):
+        if name not in ALLOWED_FUNCTIONS and name not in variables:
+            return False, "Error: Disallowed function or variable name"
+
+    # Attribute access is limited to math.<allowed function>, so variables holding
+    # matrices cannot reach the attributes of Matrix and ndarray
+    previous = None
+    for match in _TOKEN_PATTERN.finditer(expr):
+        name = match.group(1)
+        if name and expr[match.start() - 1:match.start()] == '.':
+            if not (previous and previous.group(1) == 'math' and previous.end() == match.start() - 1
+                    and name in ALLOWED_FUNCTIONS and hasattr(math, name)):
+                return False, "Error: Disallowed function or variable name"
+        previous = match
+
+    return True, ""
+
+
+def _is_whole_operand_start(expr, start):
+    """
+    Whether an operand starting at expr[start] is a whole term of its sum, i.e. not part of a
+    longer name and not the right-hand side of '/', '%' or '**', even behind unary signs.
+    """
+    before = expr[:start]
+    if before[-1:].isalnum() or before[-1:] in ('_', '.', ')', ']'):
+        return False
+    signs = before.rstrip('+-')
+    if len(signs) < len(before):
+        # A sign right after an operand is a binary + or -, which starts a new term
+        if signs[-1:].isalnum() or signs[-1:] in ('_', '.', ')', ']'):
+            return True
+    return not signs.endswith(('/', '%', '**'))
+
+
+def _rewrite_fact_quotients(expr):
+    for pattern, replacement in _FACT_QUOTIENT_PATTERNS:
+        expr = pattern.sub(
+            lambda m: replacement.format(*m.groups()) if _is_whole_operand_start(m.string, m.start()) else m.group(0),
+            expr)
+    return expr
+
+
+def prepare_expression(expr, variables=()):
+    """Rewrite calculator syntax into a Python expression; returns it with the parsed matrix literals."""
+    # Numeric matrix literals are parsed by NumPy up front and passed to eval() by name
+    expr, matrix_literals = extract_matrix_literals(expr)
+
+    # pi is looked up in safe_dict, so names containing 'pi' are left intact
+    expr = expr.replace('π', 'pi')
+
+    # Handle percentages first, e.g., 50% -> (50/100)
+    expr = re.sub(r'(\d+\.?\d*)%', r'(\1/100)', expr)
+
+    # Handle implicit multiplication: 2(3), 2sqrt(4), 3x, (2)pi and, for variables, x(2)
+    expr = re.sub(rf'({_NUMBER}|\))(\s*\()', r'\1*\2', expr)
+    expr = re.sub(rf'({_NUMBER}|\))\s*(?![eE][+\-]?\d)([a-zA-Z_][a-zA-Z0-9_]*)', r'\1*\2', expr)
+    if variables:
+        names = '|'.join(re.escape(name) for name in variables)
+        expr = re.sub(rf'(?<![a-zA-Z0-9_.])({names})(\s*\()', r'\1*\2', expr)
+
+    expr = expr.replace('^', '**')
+    expr = re.sub(r'(\d+(?:\.\d+)?|\))\s*!', r'math.factorial(\1)', expr)
+
+    # Factorial quotients are computed as falling products instead of two full factorials:
+    # fact(n)/(fact(k)*fact(n-k)) and fact(a)/fact(b). Only where the quotient is a whole
+    # operand, i.e. not after '/', '%' or '**' (even behind a unary sign) and not raised to a power.
+    expr = _rewrite_fact_quotients(expr)
+
+    return expr, matrix_literals
+
+
+def make_safe_dict():
+    """The functions and constants an expression may use."""
+    return {
+        'sqrt': math.sqrt,
+        'pi': math.pi,
+        'fact': special_functions.fact,
+        'fact_quotient': special_functions.fact_quotient,
+        'sin': math.sin,
+        'cos': math.cos,
+        'tan': math.tan,
+        'log10': math.log10,
+        'ln': math.log,
+        'abs': abs,
+        'math': math,
+        'mat': matrix_from_list,
+        'inv': matrix_inv,
+        'det': matrix_det,
+        'solve': matrix_solve,
+        'transpose': matrix_transpose,
+    }
+
+
+def evaluate_expression(expr, variables=None):
+    """
+    Evaluate an expression that has passed validate_expression() and return the raw
+    result (a number or a Matrix). variables maps variable names to their values.
+    Errors are raised; see describe_error().
+    """
+    variables = variables or {}
+    expr, matrix_literals = prepare_expression(expr, variables)
+    safe_dict = make_safe_dict()
+    safe_dict.update(variables)
+    safe_dict.update(matrix_literals)
+
+    # Use eval with restricted globals and locals for safety
+    result = eval(expr, {"__builtins__": {}}, safe_dict)
+    # A comma outside brackets and calls, e.g. 1,2 or [1,2],[3,4], makes a tuple
+    if isinstance(result, tuple):
+        raise SyntaxError("commas are only allowed inside brackets and function arguments")
+    return result
+
+
+def format_result(result):
+    """Format a result for the display; large matrices are summarised by their shape."""
+    if isinstance(result, Matrix):
+        if result.array.size <= MATRIX_INLINE_LIMIT:
+            return result.format_inline()
+        return f"[{result.describe()}]"
+    if isinstance(result, (int, float)):
+        return _format_number(result)
+    return str(result)
+
+
+def describe_error(error):
+    """Map an evaluation error to the (display, status bar) messages shown for it."""
+    if isinstance(error, MemoryError):
+        return "Error: Out of memory", "Error: Calculation exceeded the memory limit"
+    if isinstance(error, TimeoutError):
+        return "Error: Calculation took too long", f"Error: {error}"
+    if isinstance(error, ZeroDivisionError):
+        return "Error: Division by zero", "Error: Division by zero"
+    if isinstance(error, OverflowError):
+        return "Error: Result too large", "Error: Result too large"
+    if isinstance(error, ValueError):
+        return f"Error: {str(error)}", f"Error: {str(error)}"
+    if isinstance(error, SyntaxError):
+        return "Error: Invalid expression", "Error: Invalid expression syntax"
+    if isinstance(error, NameError):
+        return "Error: Invalid function/name", f"Error: Invalid function/name - {error}"
+    if isinstance(error, TypeError):
+        return "Error: Invalid type for operation", f"Error: Invalid type for operation - {error}"
+    return "Error: Calculation failed", f"Error: An unexpected error occurred: {error}"
+
+
+# name = expression, e.g. "b = sqrt(a)*pi"
+_ASSIGNMENT_PATTERN = re.compile(r'^\s*([a-zA-Z][a-zA-Z0-9]*)\s*=\s*(.*?)\s*$')
+
+
+def parse_assignment(text):
+    """Split 'name = expression' into (name, expression), or return None if text is not an assignment."""
+    match = _ASSIGNMENT_PATTERN.match(text)
+    return (match.group(1), match.group(2)) if match else None
+
+
+def _same_value(old, new):
+    if isinstance(old, Matrix) or isinstance(new, Matrix):
+        return (isinstance(old, Matrix) and isinstance(new, Matrix)
+                and np.array_equal(old.array, new.array))
+    return old == new
+
+
+class VariableGraph:
+    """
+    Named variables defined by expressions, e.g. a = 3x+1, kept as a dependency graph.
+
+    Redefining a variable recomputes only the variables downstream of it, in topological
+    order, and a variable whose value did not change stops recomputation of its own
+    dependents (early cutoff). Variables may refer to names that are not defined yet;
+    they show an error until those are defined.
+    """
+
+    def __init__(self, evaluate=evaluate_expression):
+        self.evaluate = evaluate  # Called as evaluate(expression, variables)
+        self.definitions = {}  # name -> expression
+        self.dependencies = {}  # name -> names the expression refers to
+        self.dependents = {}  # name -> names whose expressions refer to it, defined or not
+        self.values = {}  # name -> value, for variables that evaluated successfully
+        self.errors = {}  # name -> display error message, for variables that did not
+
+    def define(self, name, expr):
+        """
+        Set or replace the definition of name and recompute it and its dirty dependents.
+        Returns the names that were recomputed, in evaluation order. Raises ValueError
+        for an invalid name or expression and for circular references, leaving the
+        graph unchanged.
+        """
+        if name in make_safe_dict() or name in ALLOWED_FUNCTIONS or re.match(r'^[eE]\d*$', name):
+            raise ValueError(f"'{name}' cannot be used as a variable name")
+        if not expr:
+            raise ValueError(f"Missing expression for '{name}'")
+
+        dependencies = {n for n in expression_names(expr) if n not in ALLOWED_FUNCTIONS}
+        is_valid, error_msg = validate_expression(expr, dependencies)
+        if not is_valid:
+            raise ValueError(error_msg[len("Error: "):])
+        cycle = self._find_path(dependencies, name)
+        if cycle:
+            raise ValueError("Circular reference: " + " -> ".join([name] + cycle))
+
+        for dependency in self.dependencies.get(name, ()):
+            self.dependents[dependency].discard(name)
+        for dependency in dependencies:
+            self.dependents.setdefault(dependency, set()).add(name)
+        self.definitions[name] = expr
+        self.dependencies[name] = dependencies
+
+        return self._recompute(name)
+
+    def _find_path(self, starts, target):
+        """Return a dependency path from one of starts to target, or None if there is none."""
+        stack = [(start, [start]) for start in starts]
+        seen = set()
+        while stack:
+            node, path = stack.pop()
+            if node == target:
+                return path
+            if node in seen:
+                continue
+            seen.add(node)
+            stack.extend((dependency, path + [dependency]) for dependency in self.dependencies.get(node, ()))
+        return None
+
+    def _downstream_order(self, name):
+        """name followed by its transitive dependents, in topological order."""
+        order = []
+        visited = {name}
+        # Iterative depth-first search, so long chains of definitions do not hit the recursion limit
+        stack = [(name, iter(self.dependents.get(name, ())))]
+        while stack:
+            node, dependents = stack[-1]
+            for dependent in dependents:
+                if dependent not in visited:
+                    visited.add(dependent)
+                    stack.append((dependent, iter(self.dependents.get(dependent, ()))))
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+        order.reverse()
+        return order
+
+    def _recompute(self, name):
+        changed = set()
+        recomputed = []
+        for node in self._downstream_order(name):
+            if node != name and not self.dependencies[node] & changed:
+                continue  # None of its inputs changed value (early cutoff)
+            old_value, old_error = self.values.get(node), self.errors.get(node)
+            self._evaluate(node)
+            recomputed.append(node)
+            if self.errors.get(node) != old_error or not _same_value(old_value, self.values.get(node)):
+                changed.add(node)
+        return recomputed
+
+    def values_for(self, expr):
+        """The values of the variables expr refers to; evaluating it needs no others."""
+        return {name: self.values[name] for name in expression_names(expr) if name in self.values}
+
+    def _evaluate(self, name):
+        self.values.pop(name, None)
+        self.errors.pop(name, None)
+        for dependency in sorted(self.dependencies[name]):
+            if dependency not in self.definitions:
+                self.errors[name] = f"Error: Undefined variable '{dependency}'"
+                return
+            if dependency not in self.values:
+                self.errors[name] = f"Error: '{dependency}' has an error"
+                return
+        try:
+            value = self.evaluate(self.definitions[name], {n: self.values[n] for n in self.dependencies[name]})
+            format_result(value)  # Values too large to display are errors, as in the display
+            self.values[name] = value
+        except Exception as e:
+            self.errors[name] = describe_error(e)[0]
+
+    def describe(self, name):
+        """'name = expression = value' (or the error), as shown in the history and variables list."""
+        result = self.errors.get(name) or format_result(self.values[name])
+        return f"{name} = {self.definitions[name]} = {result}"
+
+
+def _address_space_size():
+    """Current virtual memory size of this process in bytes, or None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def _evaluation_worker(conn, memory_limit, cpu_limit):
+    """
+    Worker process loop: receive (expression, variables), send back (ok, result or exception,
+    factorial cache hits and misses during the evaluation).
+    """
+    import resource
+
+    # Load NumPy before the memory limit applies, so matrix mode does not fail while importing it
+    try:
+        _import_numpy()
+    except ValueError:
+        pass
+
+    # The forked process already maps the parent's memory, so the limit is on top of that. Without
+    # /proc (e.g. macOS, which does not enforce RLIMIT_AS anyway) the memory is not limited.
+    inherited = _address_space_size()
+    if inherited is not None:
+        address_space = inherited + memory_limit
+        resource.setrlimit(resource.RLIMIT_AS, (address_space, address_space))
+    # Workers killed by SIGXCPU would otherwise leave a core dump each time
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    cpu_hard_limit = resource.getrlimit(resource.RLIMIT_CPU)[1]
+
+    while True:
+        try:
+            expr, variables = conn.recv()
+        except (EOFError, OSError):
+            return
+
+        # Each request gets cpu_limit more seconds of CPU time; beyond that SIGXCPU kills the worker
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_soft_limit = math.ceil(usage.ru_utime + usage.ru_stime) + cpu_limit
+        if cpu_hard_limit != resource.RLIM_INFINITY:
+            cpu_soft_limit = min(cpu_soft_limit, cpu_hard_limit)
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_soft_limit, cpu_hard_limit))
+
+        hits, misses = special_functions.hits, special_functions.misses
+        try:
+            reply = (True, evaluate_expression(expr, variables))
+        except Exception as e:
+            reply = (False, e)
+        cache_counts = (special_functions.hits - hits, special_functions.misses - misses)
+        try:
+            conn.send(reply + (cache_counts,))
+        except Exception as e:  # Result or exception could not be pickled
+            conn.send((False, RuntimeError(f"could not return result: {e}"), cache_counts))
+
+
+class _PoolWorker:
+    """One warm worker process and the parent's end of its pipe."""
+
+    def __init__(self, context, memory_limit, cpu_limit):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_evaluation_worker, args=(child_conn, memory_limit, cpu_limit),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self):
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+
+
+class EvaluationPool:
+    """
+    Warm pool of forked worker processes that evaluate expressions under memory and CPU
+    limits (resource.setrlimit), so a crafted expression cannot exhaust the memory of the
+    process running the UI. The memory limit needs /proc and so only applies on Linux.
+    evaluate() is synchronous: the caller waits until the worker answers, hits its CPU
+    limit or the timeout expires. Workers that crash, hit a limit or time out are replaced
+    automatically. Only available where fork() and the resource module are.
+    """
+
+    def __init__(self, size=2, memory_limit=512 * 1024 * 1024, cpu_limit=5, timeout=10):
+        import multiprocessing
+        import queue
+        import threading
+
+        self.size = size
+        self.memory_limit = memory_limit  # Bytes each worker may allocate beyond what it inherits
+        self.cpu_limit = cpu_limit  # CPU seconds per evaluation
+        self.timeout = timeout  # Wall-clock seconds to wait for a result
+        self.restarts = 0
+        self.evaluations = 0
+        self.factorial_cache_hits = 0  # Summed over all workers, including replaced ones
+        self.factorial_cache_misses = 0
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._context = multiprocessing.get_context('fork')
+        # Most recently used first, so repeated workloads stay on a worker whose factorial cache is warm
+        self._idle = queue.LifoQueue()
+        self._workers = []
+        # Filled before forking, so every worker, including replacements, inherits the full table
+        special_functions.fact(FACTORIAL_TABLE_LIMIT)
+        for _ in range(size):
+            worker = self._start_worker()
+            self._workers.append(worker)
+            self._idle.put(worker)
+
+    @staticmethod
+    def available():
+        """Whether workers can be forked and resource-limited on this platform."""
+        try:
+            import multiprocessing
+            import resource  # noqa: F401
+        except ImportError:
+            return False
+        return 'fork' in multiprocessing.get_all_start_methods()
+
+    def _start_worker(self):
+        return _PoolWorker(self._context, self.memory_limit, self.cpu_limit)
+
+    def _restart(self, worker):
+        """Replace a dead or stuck worker with a fresh one."""
+        worker.stop()
+        replacement = self._start_worker()
+        with self._lock:
+            self._workers[self._workers.index(worker)] = replacement
+            self.restarts += 1
+        return replacement
+
+    def evaluate(self, expr, variables=None):
+        """
+        Evaluate a validated expression in a worker and return the result, raising the
+        worker's exception on error, or MemoryError/TimeoutError/RuntimeError if the
+        worker ran out of memory, took too long or crashed.
+        """
+        with self._lock:
+            self._waiting += 1
+        worker = self._idle.get()
+        with self._lock:
+            self._waiting -= 1
+            self.evaluations += 1
+
+        try:
+            # A worker that died while idle (OOM killer, killed externally) is replaced before it
+            # gets the request, so the calculation is not blamed for it
+            if not worker.process.is_alive():
+                worker = self._restart(worker)
+            try:
+                worker.conn.send((expr, variables or {}))
+                if worker.conn.poll(self.timeout):
+                    ok, value, (hits, misses) = worker.conn.recv()
+                    with self._lock:
+                        self.factorial_cache_hits += hits
+                        self.factorial_cache_misses += misses
+                else:
+                    worker = self._restart(worker)
+                    ok, value = False, TimeoutError(f"no result after {self.timeout} seconds")
+            except (EOFError, OSError):
+                # The worker died: killed by the CPU limit (SIGXCPU), out of memory or crashed
+                worker.process.join()
+                exit_code = worker.process.exitcode
+                worker = self._restart(worker)
+                if exit_code == -signal.SIGXCPU:
+                    ok, value = False, TimeoutError(f"CPU limit of {self.cpu_limit} seconds exceeded")
+                else:
+                    ok, value = False, RuntimeError(f"evaluation worker exited with code {exit_code}")
+        finally:
+            self._idle.put(worker)
+
+        if not ok:
+            raise value
+        return value
+
+    def stats(self):
+        """
+        Counters for monitoring: worker count, idle workers, queue depth, restarts, evaluations
+        and the workers' factorial cache hits and misses.
+        """
+        with self._lock:
+            return {
+                'workers': self.size,
+                'idle': self._idle.qsize(),
+                'queue_depth': self._waiting,
+                'restarts': self.restarts,
+                'evaluations': self.evaluations,
+                'factorial_cache_hits': self.factorial_cache_hits,
+                'factorial_cache_misses': self.factorial_cache_misses,
+            }
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
+
+
+class StartupProfile:
+    """
+    Records the cost of each startup phase and the time to the first drawn frame, measured
+    from when main.py started loading (interpreter startup is not included).
+    """
+
+    def __init__(self, output=None):
+        self.output = output  # Stream the report is written to once startup finishes, if any
+        self.phases = []  # (name, started at, duration) in seconds since main.py started loading
+        self.first_frame = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.phases.append((name, start - _IMPORT_START, end - start))
+
+    def mark_first_frame(self):
+        self.first_frame = time.perf_counter() - _IMPORT_START
+
+    def finish(self):
+        """Called once all deferred startup work is done; writes the report if requested."""
+        if self.output is not None:
+            print(self.report(time.perf_counter() - _IMPORT_START), file=self.output)
+
+    def report(self, total):
+        lines = ["Startup profile (ms since main.py started loading):"]
+        for name, started, duration in self.phases:
+            lines.append(f"  {name:<28}{duration * 1000:8.1f}   (at {started * 1000:.1f})")
+        if self.first_frame is not None:
+            lines.append(f"  {'time to first frame':<28}{self.first_frame * 1000:8.1f}")
+        lines.append(f"  {'fully started':<28}{total * 1000:8.1f}")
+        return '\n'.join(lines)
 
 
 class Calculator:
-    def __init__(self, master):
-        print("Calculator: __init__ started")
+    def __init__(self, master, profile=None):
+        _import_tkinter()
         self.master = master
+        self.profile = profile or StartupProfile()
         self.master.title("Scientific Calculator")
         self.master.geometry("400x550")  # Slightly taller to accommodate UI improvements
 
@@ -64,7 +978,65 @@ class Calculator:
         # or len(self.history) if current input is not from history
         self.history_index = 0
 
-        # Display setup
+        # Last matrix result, shown in the matrix viewer
+        self.last_matrix = None
+        self.matrix_window = None
+        self.matrix_text = None
+
+        # Sandboxed worker processes for evaluation, started after the first frame
+        self.pool = None
+
+        # Named variables, shown in the variables dialog
+        self.variables = VariableGraph(self.evaluate)
+        self.variables_window = None
+        self.variables_listbox = None
+
+        # Memory value, the memory buttons themselves are created after the first frame
+        self.memory_value = 0
+        self.context_menu = None
+
+        # Only the display and keypad are built before the first frame; everything else is
+        # deferred to idle callbacks so the window appears as early as possible
+        with self.profile.phase("display"):
+            self.create_display()
+        with self.profile.phase("keypad"):
+            self.create_keypad()
+        self.deferred_phases = [
+            ("key bindings", self.create_key_bindings),
+            ("memory buttons", lambda: self.create_memory_buttons([['MC', 'MR', 'M+', 'M-']])),
+            ("context menu", self.create_context_menu),
+            ("evaluation pool", self.create_evaluation_pool),
+        ]
+        # The first Expose of the keypad means the first frame is being drawn; Tk redraws in idle
+        # callbacks queued ahead of ours, so the deferred phases start once it is on screen
+        self.deferred_started = False
+        self.button_frame.bind('<Expose>', lambda e: self._start_deferred_phases(first_frame=True))
+        # Fallback for windows that start iconified or withdrawn and never get an Expose
+        self.master.after(500, self._start_deferred_phases)
+
+    def _start_deferred_phases(self, first_frame=False):
+        """Start the deferred startup phases, once, from the first Expose or the fallback timer."""
+        if self.deferred_started:
+            return
+        self.deferred_started = True
+        self.button_frame.unbind('<Expose>')
+        self.master.after_idle(self._run_deferred_phase, first_frame)
+
+    def _run_deferred_phase(self, first_frame=False):
+        """Run one deferred startup phase per idle callback, so input is handled between them."""
+        if first_frame:
+            self.profile.mark_first_frame()
+        if not self.deferred_phases:
+            self.profile.finish()
+            return
+        name, build = self.deferred_phases.pop(0)
+        with self.profile.phase(f"deferred: {name}"):
+            build()
+        self.master.after_idle(self._run_deferred_phase)
+
+    def create_display(self):
+        """Create the history label, main display and status bar."""
+        self.master.config(bg=self.current_theme['bg'])
         self.display_var = tk.StringVar(value="0")
         self.display_frame = tk.Frame(self.master, bg=self.current_theme['bg'], bd=2, relief=tk.RAISED)
         self.display_frame.grid(row=0, column=0, columnspan=4, sticky='nsew', padx=10, pady=10)
@@ -85,6 +1057,46 @@ class Calculator:
         self.display.pack(fill='both', expand=True, padx=5, pady=5)
         self.display.focus_set()
 
+        # Status bar
+        self.status_var = tk.StringVar(value="Ready")
+        self.status_bar = tk.Label(self.master, textvariable=self.status_var, bd=1, relief=tk.SUNKEN, anchor=tk.W,
+                                   bg=self.current_theme['bg'], fg=self.current_theme['fg'])
+        self.status_bar.grid(row=2, column=0, columnspan=4, sticky='ew')
+
+    def create_keypad(self):
+        """Create the main calculator buttons."""
+        # MODIFIED: Button layout now includes '%' instead of 'log10'
+        buttons_layout = [
+            ['AC', 'DEL', '%', '+'],
+            ['7', '8', '9', '-'],
+            ['4', '5', '6', '*'],
+            ['1', '2', '3', '/'],
+            ['0', '.', '=', 'sqrt'],
+            ['fact', 'pi', '(', ')'],
+            ['1/x', '^', '+/-', 'Hist']
+        ]
+
+        # Store the number of rows in the main button layout BEFORE creating buttons
+        self.main_button_rows_count = len(buttons_layout)
+
+        # Create button frame for better organization
+        self.button_frame = tk.Frame(self.master, bg=self.current_theme['bg'])
+        self.button_frame.grid(row=1, column=0, columnspan=4, sticky='nsew', padx=5, pady=5)
+        self.master.rowconfigure(1, weight=1)
+
+        self.buttons = []  # Store button references for theme changes
+        self.create_buttons(buttons_layout)
+
+        # Grid configuration
+        for i in range(4):
+            self.master.columnconfigure(i, weight=1)
+            self.button_frame.columnconfigure(i, weight=1)
+
+        for i in range(self.main_button_rows_count):  # For rows in button frame
+            self.button_frame.rowconfigure(i, weight=1)
+
+    def create_key_bindings(self):
+        """Bind keyboard shortcuts, history navigation and the numpad."""
         # Bind Enter and Numpad Enter on the Entry widget to '='
         self.display.bind('<Return>', lambda e: self.button_press('='))
         self.display.bind('<KP_Enter>', lambda e: self.button_press('='))
@@ -118,61 +1130,43 @@ class Calculator:
         for key, value in numpad_keys.items():
             self.master.bind(key, lambda e, v=value: self.button_press(v))
 
-        # MODIFIED: Button layout now includes '%' instead of 'log10'
-        buttons_layout = [
-            ['AC', 'DEL', '%', '+'],
-            ['7', '8', '9', '-'],
-            ['4', '5', '6', '*'],
-            ['1', '2', '3', '/'],
-            ['0', '.', '=', 'sqrt'],
-            ['fact', 'pi', '(', ')'],
-            ['1/x', '^', '+/-', 'Hist']
-        ]
-
-        # Store the number of rows in the main button layout BEFORE creating buttons
-        self.main_button_rows_count = len(buttons_layout)
-
-        # Create button frame for better organization
-        self.button_frame = tk.Frame(self.master, bg=self.current_theme['bg'])
-        self.button_frame.grid(row=1, column=0, columnspan=4, sticky='nsew', padx=5, pady=5)
-        self.master.rowconfigure(1, weight=1)
-
-        self.buttons = []  # Store button references for theme changes
-        self.create_buttons(buttons_layout)
-
-        # Memory functions
-        memory_layout = [['MC', 'MR', 'M+', 'M-']]
-        self.memory_value = 0
-        self.create_memory_buttons(memory_layout)
-
-        # Grid configuration
-        for i in range(4):
-            self.master.columnconfigure(i, weight=1)
-            self.button_frame.columnconfigure(i, weight=1)
-
-        for i in range(self.main_button_rows_count + len(memory_layout)):  # For rows in button frame
-            self.button_frame.rowconfigure(i, weight=1)
-
-        # Status bar
-        self.status_var = tk.StringVar(value="Ready")
-        self.status_bar = tk.Label(self.master, textvariable=self.status_var, bd=1, relief=tk.SUNKEN, anchor=tk.W,
-                                   bg=self.current_theme['bg'], fg=self.current_theme['fg'])
-        self.status_bar.grid(row=2, column=0, columnspan=4, sticky='ew')
-
-        # Context menu
+    def create_evaluation_pool(self):
+        """Start the sandboxed evaluation workers, where the platform supports them."""
+        if self.pool is None and EvaluationPool.available():
+            self.pool = EvaluationPool()
+
+    def evaluate(self, expr, variables):
+        """Evaluate a validated expression in the worker pool, or in this process if there is none."""
+        if self.pool is None:
+            self.create_evaluation_pool()
+        if self.pool is not None:
+            return self.pool.evaluate(expr, variables)
+        return evaluate_expression(expr, variables)
+
+    def show_pool_status(self):
+        """Show the worker pool counters in the status bar."""
+        if self.pool is None:
+            self.status_var.set("Worker pool not available, evaluating in process")
+            return
+        stats = self.pool.stats()
+        self.status_var.set(f"Workers: {stats['workers']} ({stats['idle']} idle), queue depth {stats['queue_depth']}, "
+                            f"restarts {stats['restarts']}, evaluations {stats['evaluations']}, "
+                            f"factorial cache {stats['factorial_cache_hits']} hits/"
+                            f"{stats['factorial_cache_misses']} misses")
+
+    def create_context_menu(self):
+        """Create the right-click context menu."""
         self.context_menu = tk.Menu(self.master, tearoff=0, bg=self.current_theme['bg'], fg=self.current_theme['fg'])
         self.context_menu.add_command(label="Toggle Theme", command=self.toggle_theme)
         self.context_menu.add_command(label="Copy", command=self.copy_to_clipboard)
         self.context_menu.add_command(label="Paste", command=self.paste_from_clipboard)
+        self.context_menu.add_command(label="Show Matrix", command=self.show_matrix_viewer)
+        self.context_menu.add_command(label="Variables", command=self.show_variables_dialog)
+        self.context_menu.add_command(label="Worker Pool Status", command=self.show_pool_status)
         self.context_menu.add_separator()
         self.context_menu.add_command(label="Clear History", command=self.clear_history)
         self.master.bind('<Button-3>', self.show_context_menu)
 
-        # Apply initial theme
-        print("Calculator: __init__ completed")
-        self._apply_theme_to_widgets()
-        print("Theme applied")
-
     def _apply_theme_to_widgets(self):
         """Apply the current theme to all widgets."""
         self.master.config(bg=self.current_theme['bg'])
@@ -184,49 +1178,54 @@ class Calculator:
                             insertbackground=self.current_theme['display_insert_bg'],
                             highlightcolor=self.current_theme['button_fg'])
         self.status_bar.config(bg=self.current_theme['bg'], fg=self.current_theme['fg'])
-        self.context_menu.config(bg=self.current_theme['bg'], fg=self.current_theme['fg'])
+        if self.context_menu is not None:
+            self.context_menu.config(bg=self.current_theme['bg'], fg=self.current_theme['fg'])
 
         self._apply_theme_to_buttons()
 
     def _apply_theme_to_buttons(self):
         """Apply the current theme to all calculator and memory buttons."""
         for button in self.buttons:
-            text = button.cget('text')
-            if text == '=':
-                button.config(bg=self.current_theme['equals_bg'], fg=self.current_theme['equals_fg'])
-            elif text in ['AC', 'DEL']:
-                button.config(bg=self.current_theme['clear_bg'], fg=self.current_theme['clear_fg'])
-            elif text in ['MC', 'MR', 'M+', 'M-']:
-                button.config(bg=self.current_theme['memory_bg'], fg=self.current_theme['memory_fg'])
-            elif text in ['+', '-', '*', '/', '^', '%']:  # MODIFIED: Added '%' for operator styling
-                button.config(bg=self.current_theme['operator_bg'], fg=self.current_theme['operator_fg'])
-            elif text in ['sqrt', 'fact', '1/x', 'log10', 'pi']:
-                button.config(bg=self.current_theme['function_bg'], fg=self.current_theme['function_fg'])
-            else:
-                button.config(bg=self.current_theme['button_bg'], fg=self.current_theme['button_fg'])
-
+            bg, fg = self._button_colors(button.cget('text'))
             # Ensure active colors match base colors for consistency
-            button.config(activebackground=button.cget('bg'), activeforeground=button.cget('fg'))
+            button.config(bg=bg, fg=fg, activebackground=bg, activeforeground=fg)
+
+    def _button_colors(self, text):
+        """Return the (background, foreground) theme colors for a button label."""
+        if text == '=':
+            return self.current_theme['equals_bg'], self.current_theme['equals_fg']
+        elif text in ['AC', 'DEL']:
+            return self.current_theme['clear_bg'], self.current_theme['clear_fg']
+        elif text in ['MC', 'MR', 'M+', 'M-']:
+            return self.current_theme['memory_bg'], self.current_theme['memory_fg']
+        elif text in ['+', '-', '*', '/', '^', '%']:  # MODIFIED: Added '%' for operator styling
+            return self.current_theme['operator_bg'], self.current_theme['operator_fg']
+        elif text in ['sqrt', 'fact', '1/x', 'log10', 'pi']:
+            return self.current_theme['function_bg'], self.current_theme['function_fg']
+        return self.current_theme['button_bg'], self.current_theme['button_fg']
 
     def create_buttons(self, buttons_layout):
         """Create and grid calculator buttons with improved styling."""
         for row_idx, row_buttons in enumerate(buttons_layout):
             for col_idx, label in enumerate(row_buttons):
                 if label:
+                    bg, fg = self._button_colors(label)
                     button = tk.Button(self.button_frame, text=label, font=('Arial', 14, 'bold'),
-                                       relief='raised', bd=3,
-                                       command=lambda l=label: self.button_press(l))
+                                       relief='raised', bd=3, bg=bg, fg=fg, activebackground=bg,
+                                       activeforeground=fg, command=lambda l=label: self.button_press(l))
                     button.grid(row=row_idx, column=col_idx, sticky='nsew', padx=2, pady=2)
                     self.buttons.append(button)
 
     def create_memory_buttons(self, memory_layout):
         """Create memory function buttons with improved styling."""
         for row_idx, row_buttons in enumerate(memory_layout):
+            self.button_frame.rowconfigure(row_idx + self.main_button_rows_count, weight=1)
             for col_idx, label in enumerate(row_buttons):
                 if label:
+                    bg, fg = self._button_colors(label)
                     button = tk.Button(self.button_frame, text=label, font=('Arial', 12, 'bold'),
-                                       relief='raised', bd=2,
-                                       command=lambda l=label: self.memory_function(l))
+                                       relief='raised', bd=2, bg=bg, fg=fg, activebackground=bg,
+                                       activeforeground=fg, command=lambda l=label: self.memory_function(l))
                     button.grid(row=row_idx + self.main_button_rows_count, column=col_idx, sticky='nsew', padx=2,
                                 pady=2)
                     self.buttons.append(button)
@@ -275,7 +1274,8 @@ class Calculator:
         try:
             clipboard_text = self.master.clipboard_get()
             # Allow only numeric and operator characters
-            filtered_text = re.sub(r'[^0-9.+\-*/()^%]', '', clipboard_text)  # MODIFIED: Added %
+            # Brackets, commas and exponents (1e-05) are kept for pasted matrix data
+            filtered_text = re.sub(r'[^0-9.eE+\-*/()^%\[\],]', '', clipboard_text)
             if filtered_text:
                 cursor_pos = self.display.index(tk.INSERT)
                 current = self.display_var.get()
@@ -313,6 +1313,8 @@ class Calculator:
             '.': '.', '(': '(', ')': ')', '^': '^', '%': '%',
             's': 'sqrt', 'f': 'fact', 'i': '1/x', 'p': 'pi',
             'n': '+/-', 'l': 'log10',
+            '[': '[', ']': ']', ',': ',',
+            'd': 'det', 'v': 'inv', 't': 'transpose', 'S': 'solve',
         }
 
         shift_mapping = {
@@ -321,11 +1323,12 @@ class Calculator:
 
         ctrl_mapping = {
             'h': 'Hist',  # Ctrl+H for History
+            'd': 'Vars',  # Ctrl+D for Variables
         }
 
-        # Check for Ctrl combinations first
-        if event.state & 0x4 and char.lower() in ctrl_mapping:  # Ctrl pressed
-            self.button_press(ctrl_mapping[char.lower()])
+        # Check for Ctrl combinations first; with Ctrl held, char is a control code such as '\x04'
+        if event.state & 0x4 and keysym.lower() in ctrl_mapping:  # Ctrl pressed
+            self.button_press(ctrl_mapping[keysym.lower()])
             return 'break'
         # Check for Shift combinations
         elif event.state & 0x1 and keysym in shift_mapping:  # Shift pressed
@@ -357,8 +1360,8 @@ class Calculator:
         self.status_var.set(f"'{label}' pressed")
 
         # Clear initial zero for new input (except decimal or operators)
-        if current == "0" and label not in ['.', 'AC', 'DEL', '=', '+/-', 'Hist', '+', '-', '*', '/', '^', '%', '(',
-                                            ')']:  # MODIFIED: Added '%'
+        if current == "0" and label not in ['.', 'AC', 'DEL', '=', '+/-', 'Hist', 'Vars', '+', '-', '*', '/', '^', '%',
+                                            '(', ')', ']', ',']:
             current = ""
             cursor_pos = 0
 
@@ -369,6 +1372,7 @@ class Calculator:
 
         is_operator = label in '+-*/^%'  # MODIFIED: Added '%'
         is_function = label in ['sqrt', 'fact', '1/x', 'log10']
+        is_matrix_function = label in MATRIX_FUNCTIONS
         is_constant = label == 'pi'
 
         if label in '0123456789.':
@@ -405,12 +1409,16 @@ class Calculator:
                 self.set_cursor_position(cursor_pos + 1)
         elif is_function:
             self.handle_function(label, current, cursor_pos)
+        elif is_matrix_function:
+            new_text = current[:cursor_pos] + f"{label}()" + current[cursor_pos:]
+            self.display_var.set(new_text)
+            self.set_cursor_position(cursor_pos + len(label) + 1)  # Place cursor inside parentheses
         elif is_constant:
             pi_str = str(math.pi)
             new_text = current[:cursor_pos] + pi_str + current[cursor_pos:]
             self.display_var.set(new_text)
             self.set_cursor_position(cursor_pos + len(pi_str))
-        elif label in '()':
+        elif label in ['(', ')', '[', ']', ',']:
             new_text = current[:cursor_pos] + label + current[cursor_pos:]
             self.display_var.set(new_text)
             self.set_cursor_position(cursor_pos + 1)
@@ -418,6 +1426,8 @@ class Calculator:
             self.handle_sign_toggle(current, cursor_pos)
         elif label == 'Hist':
             self.show_history_dialog()
+        elif label == 'Vars':
+            self.show_variables_dialog()
 
     def handle_function(self, func, current, cursor_pos):
         """Handle mathematical functions with proper cursor positioning."""
@@ -518,32 +1528,6 @@ class Calculator:
             self.set_cursor_position(cursor_pos + 1)
         self.status_var.set("Sign toggled")
 
-    def _validate_expression(self, expr):
-        """
-        Validates the expression to ensure it only contains allowed characters
-        before evaluation. This is a crucial security measure for eval().
-        """
-        # MODIFIED: Added % to allowed characters
-        allowed_chars_pattern = r"^[0-9+\-*/().^%πa-zA-Z]*$"
-
-        # Check for disallowed characters first
-        if not re.match(allowed_chars_pattern, expr):
-            return False, "Error: Invalid characters in expression"
-
-        # Allowed function names that eval can safely call through safe_dict
-        allowed_functions = ['sqrt', 'fact', 'sin', 'cos', 'tan', 'log10', 'ln', 'abs', 'pi', 'math']
-
-        # Temporarily replace allowed function names to ensure no other alphabetic chars are present
-        temp_expr = expr
-        for func in allowed_functions:
-            temp_expr = temp_expr.replace(func, '')
-
-            # After removing allowed functions and pi, if there are still alphabetic characters, they are invalid.
-        if re.search(r'[a-zA-Z]', temp_expr):
-            return False, "Error: Disallowed function or variable name"
-
-        return True, ""
-
     def calculate(self):
         """Evaluate the expression with improved error handling and safety."""
         expr = self.display_var.get()
@@ -552,93 +1536,198 @@ class Calculator:
         if not expr or expr.startswith("Error:"):
             return
 
+        # Assignments such as 'a = 3x+1' define a variable instead
+        assignment = parse_assignment(expr)
+        if assignment:
+            self.define_variable(*assignment)
+            return
+
         # Validate expression for allowed characters
-        is_valid, error_msg = self._validate_expression(expr)
+        is_valid, error_msg = validate_expression(expr, self.variables.definitions)
         if not is_valid:
             self.display_var.set(error_msg)
             self.status_var.set(error_msg)
             return
 
-        # Save expression to history (before processing for display)
-        self.history.append(expr)
-
-        # --- MODIFIED SECTION START ---
-
-        # Pre-process the expression for eval()
-        expr = expr.replace('π', str(math.pi))
-        expr = expr.replace('pi', str(math.pi))
-
-        # Handle percentages first, e.g., 50% -> (50/100)
-        expr = re.sub(r'(\d+\.?\d*)%', r'(\1/100)', expr)
-
-        # Handle implicit multiplication
-        expr = re.sub(r'(\d+(?:\.\d+)?|\))(\s*\()', r'\1*\2', expr)
-        expr = re.sub(r'(\d+(?:\.\d+)?|\))\s*([a-zA-Z_][a-zA-Z0-9_]*)\(', r'\1*\2(', expr)
-        # Handle implicit multiplication for parenthesis followed by pi, e.g. (2)pi
-        expr = re.sub(r'(\))(\s*pi)', r'\1*pi', expr)
-
-        expr = expr.replace('^', '**')
-        expr = re.sub(r'(\d+(?:\.\d+)?|\))\s*!', r'math.factorial(\1)', expr)
-
-        # --- MODIFIED SECTION END ---
-
-        # Define safe functions for eval
-        safe_dict = {
-            'sqrt': math.sqrt,
-            'pi': math.pi,
-            'fact': math.factorial,
-            'sin': math.sin,
-            'cos': math.cos,
-            'tan': math.tan,
-            'log10': math.log10,
-            'ln': math.log,
-            'abs': abs,
-            'math': math
-        }
+        # Save expression to history (before processing for display); long matrix literals are shortened
+        self.history.append(expr if len(expr) <= 200 else expr[:197] + '...')
 
         try:
-            # Use eval with restricted globals and locals for safety
-            result = eval(expr, {"__builtins__": {}}, safe_dict)
-
-            # Format result
-            if isinstance(result, (int, float)):
-                formatted_result = '{:.10f}'.format(result).rstrip('0').rstrip('.')
-                if not formatted_result:
-                    formatted_result = "0"
-            else:
-                formatted_result = str(result)
+            # Only the variables the expression uses are sent to the evaluation worker
+            result = self.evaluate(expr, self.variables.values_for(expr))
+            # Formatting converts to float, so results too large for a float fail here
+            formatted_result = format_result(result)
+        except Exception as e:
+            display_msg, status_msg = describe_error(e)
+            self.display_var.set(display_msg)
+            self.status_var.set(status_msg)
+            return
 
-            self.display_var.set(formatted_result)
+        self.display_var.set(formatted_result)
 
-            # Add result to history
-            self.history[-1] = f"{self.history[-1]} = {formatted_result}"
-            self.history_index = len(self.history)
+        # Add result to history
+        self.history[-1] = f"{self.history[-1]} = {formatted_result}"
+        self.history_index = len(self.history)
 
-            # Update status bar
-            self.status_var.set("Calculation complete")
-            self.history_var.set(self.history[-1])
+        # Update status bar
+        self.status_var.set("Calculation complete")
+        self.history_var.set(self.history[-1])
 
-        except ZeroDivisionError:
-            self.display_var.set("Error: Division by zero")
-            self.status_var.set("Error: Division by zero")
-        except OverflowError:
-            self.display_var.set("Error: Result too large")
-            self.status_var.set("Error: Result too large")
+        if isinstance(result, Matrix):
+            self.last_matrix = result
+            # Large results are summarised in the display and shown truncated in the viewer
+            if result.array.size > MATRIX_INLINE_LIMIT:
+                self.show_matrix_viewer()
+
+    def define_variable(self, name, expr):
+        """Define or redefine a variable, recompute its dependents and add them to the history."""
+        try:
+            recomputed = self.variables.define(name, expr)
         except ValueError as e:
-            self.display_var.set(f"Error: {str(e)}")
-            self.status_var.set(f"Error: {str(e)}")
-        except SyntaxError:
-            self.display_var.set("Error: Invalid expression")
-            self.status_var.set("Error: Invalid expression syntax")
-        except NameError as e:
-            self.display_var.set("Error: Invalid function/name")
-            self.status_var.set(f"Error: Invalid function/name - {e}")
-        except TypeError as e:
-            self.display_var.set(f"Error: Invalid type for operation")
-            self.status_var.set(f"Error: Invalid type for operation - {e}")
-        except Exception as e:
-            self.display_var.set("Error: Calculation failed")
-            self.status_var.set(f"Error: An unexpected error occurred: {e}")
+            self.display_var.set(f"Error: {e}")
+            self.status_var.set(f"Error: {e}")
+            return False
+
+        for node in recomputed:
+            self.history.append(self.variables.describe(node))
+        self.history_index = len(self.history)
+        self.history_var.set(self.history[-len(recomputed)])
+
+        value = self.variables.values.get(name)
+        if isinstance(value, Matrix):
+            self.last_matrix = value
+        self.display_var.set(self.variables.errors.get(name) or format_result(value))
+        self.set_cursor_position(len(self.display_var.get()))
+        self.status_var.set(f"'{name}' defined, {len(recomputed) - 1} dependent variable(s) recomputed")
+        self._update_variables_list(recomputed)
+        return True
+
+    def _update_variables_list(self, names):
+        """Update the rows of the given variables in the variables dialog, if it is open."""
+        if self.variables_window is None or not self.variables_window.winfo_exists():
+            return
+        order = list(self.variables.definitions)
+        for name in names:
+            index = order.index(name)
+            if index < self.variables_listbox.size():
+                self.variables_listbox.delete(index)
+            self.variables_listbox.insert(index, self.variables.describe(name))
+
+    def show_variables_dialog(self):
+        """Display a dialog listing the variables, with an entry for defining new ones."""
+        if self.variables_window is not None and self.variables_window.winfo_exists():
+            self.variables_window.lift()
+            return
+
+        self.variables_window = tk.Toplevel(self.master)
+        self.variables_window.title("Variables")
+        self.variables_window.geometry("360x400")
+        self.variables_window.configure(bg=self.current_theme['bg'])
+        self.variables_window.transient(self.master)
+
+        entry_frame = tk.Frame(self.variables_window, bg=self.current_theme['bg'])
+        entry_frame.pack(fill='x', padx=10, pady=(10, 0))
+
+        tk.Label(entry_frame, text="Define:", bg=self.current_theme['bg'], fg=self.current_theme['fg'],
+                 font=('Arial', 12)).pack(side='left')
+        definition_var = tk.StringVar()
+        definition_entry = tk.Entry(entry_frame, textvariable=definition_var, font=('Arial', 12),
+                                    bg=self.current_theme['display_bg'], fg=self.current_theme['display_fg'],
+                                    insertbackground=self.current_theme['display_insert_bg'])
+        definition_entry.pack(side='left', fill='x', expand=True, padx=5)
+        definition_entry.focus_set()
+
+        variables_frame = tk.Frame(self.variables_window, bg=self.current_theme['bg'])
+        variables_frame.pack(fill='both', expand=True, padx=10, pady=10)
+
+        scrollbar = tk.Scrollbar(variables_frame)
+        scrollbar.pack(side='right', fill='y')
+
+        self.variables_listbox = tk.Listbox(variables_frame, bg=self.current_theme['display_bg'],
+                                            fg=self.current_theme['display_fg'], font=('Arial', 12),
+                                            selectbackground=self.current_theme['button_fg'], height=15)
+        self.variables_listbox.pack(side='left', fill='both', expand=True)
+
+        scrollbar.config(command=self.variables_listbox.yview)
+        self.variables_listbox.config(yscrollcommand=scrollbar.set)
+
+        for name in self.variables.definitions:
+            self.variables_listbox.insert(tk.END, self.variables.describe(name))
+
+        def define_from_entry():
+            assignment = parse_assignment(definition_var.get())
+            if not assignment:
+                self.status_var.set("Error: Enter a definition such as a = 3x+1")
+                return
+            if self.define_variable(*assignment):
+                definition_var.set("")
+
+        def insert_selected():
+            selected = self.variables_listbox.curselection()
+            if selected:
+                name = list(self.variables.definitions)[selected[0]]
+                current = self.display_var.get()
+                cursor_pos = self.display.index(tk.INSERT)
+                if current == "0" or current.startswith("Error"):
+                    current, cursor_pos = "", 0
+                self.display_var.set(current[:cursor_pos] + name + current[cursor_pos:])
+                self.set_cursor_position(cursor_pos + len(name))
+                self.status_var.set(f"Inserted '{name}'")
+
+        button_frame = tk.Frame(self.variables_window, bg=self.current_theme['bg'])
+        button_frame.pack(fill='x', padx=10, pady=5)
+
+        define_button = tk.Button(button_frame, text="Define", command=define_from_entry,
+                                  bg=self.current_theme['equals_bg'], fg=self.current_theme['equals_fg'],
+                                  padx=10, pady=5)
+        define_button.pack(side='left', padx=5)
+
+        insert_button = tk.Button(button_frame, text="Insert Name", command=insert_selected,
+                                  bg=self.current_theme['function_bg'], fg=self.current_theme['function_fg'],
+                                  padx=10, pady=5)
+        insert_button.pack(side='right', padx=5)
+
+        definition_entry.bind('<Return>', lambda e: define_from_entry())
+        self.variables_listbox.bind('<Double-1>', lambda e: insert_selected())
+
+    def show_matrix_viewer(self):
+        """Display the last matrix result in a multi-line viewer, reusing the window if it is open."""
+        if self.last_matrix is None:
+            self.status_var.set("No matrix result to show")
+            return
+
+        if self.matrix_window is None or not self.matrix_window.winfo_exists():
+            self.matrix_window = tk.Toplevel(self.master)
+            self.matrix_window.title("Matrix Result")
+            self.matrix_window.geometry("500x400")
+            self.matrix_window.configure(bg=self.current_theme['bg'])
+            self.matrix_window.transient(self.master)
+
+            matrix_frame = tk.Frame(self.matrix_window, bg=self.current_theme['bg'])
+            matrix_frame.pack(fill='both', expand=True, padx=10, pady=10)
+            matrix_frame.rowconfigure(0, weight=1)
+            matrix_frame.columnconfigure(0, weight=1)
+
+            # No wrapping, so rows stay aligned and long rows scroll horizontally
+            self.matrix_text = tk.Text(matrix_frame, wrap='none', font=('Courier', 11),
+                                       bg=self.current_theme['display_bg'], fg=self.current_theme['display_fg'])
+            y_scrollbar = tk.Scrollbar(matrix_frame, command=self.matrix_text.yview)
+            x_scrollbar = tk.Scrollbar(matrix_frame, orient='horizontal', command=self.matrix_text.xview)
+            self.matrix_text.config(yscrollcommand=y_scrollbar.set, xscrollcommand=x_scrollbar.set)
+            self.matrix_text.grid(row=0, column=0, sticky='nsew')
+            y_scrollbar.grid(row=0, column=1, sticky='ns')
+            x_scrollbar.grid(row=1, column=0, sticky='ew')
+
+        header = self.last_matrix.describe()
+        if self.last_matrix.array.size > MATRIX_VIEW_THRESHOLD:
+            header += " (truncated)"
+
+        self.matrix_text.config(state='normal')
+        self.matrix_text.delete('1.0', tk.END)
+        self.matrix_text.insert('1.0', f"{header}\n\n{self.last_matrix.format_view()}")
+        self.matrix_text.config(state='disabled')
+        self.matrix_window.lift()
+        self.status_var.set(f"Showing {header}")
 
     def toggle_theme(self):
         """Toggle between light and dark themes."""
@@ -666,7 +1755,7 @@ class Calculator:
             history_item = self.history[self.history_index]
 
             if '=' in history_item:
-                parts = history_item.split('=', 1)
+                parts = history_item.rsplit('=', 1)
                 self.history_var.set(parts[0].strip() + " =")
                 self.display_var.set(parts[1].strip())
             else:
@@ -717,7 +1806,7 @@ class Calculator:
             if selected:
                 selected_item = self.history[selected[0]]
                 if '=' in selected_item:
-                    parts = selected_item.split('=', 1)
+                    parts = selected_item.rsplit('=', 1)
                     self.history_var.set(parts[0].strip() + " =")
                     self.display_var.set(parts[1].strip())
                 else:
@@ -751,12 +1840,49 @@ class Calculator:
         self.status_var.set("History cleared")
 
 
-if __name__ == "__main__":
-    print("Creating Tkinter root window...")
-    root = tk.Tk()
-    print("Tkinter root window created.")
-    calc = Calculator(root)
-    print("Calculator instance created.")
-    print("Starting Tkinter main loop...")
+def run_headless(expressions):
+    """Evaluate expressions without the GUI, printing one result each. Returns the exit status."""
+    status = 0
+    for expr in expressions:
+        is_valid, error_msg = validate_expression(expr)
+        if is_valid:
+            try:
+                result = evaluate_expression(expr)
+                print(result.format_view() if isinstance(result, Matrix) else format_result(result))
+                continue
+            except Exception as e:
+                error_msg = describe_error(e)[1]
+        print(f"{expr}: {error_msg}", file=sys.stderr)
+        status = 1
+    return status
+
+
+def run_gui(profile_startup=False):
+    """Start the calculator window."""
+    profile = StartupProfile(sys.stderr if profile_startup else None)
+    with profile.phase("import tkinter"):
+        _import_tkinter()
+    with profile.phase("create root window"):
+        root = tk.Tk()
+    calculator = Calculator(root, profile=profile)
     root.mainloop()
-    print("--- Program End ---")
\ No newline at end of file
+    if calculator.pool is not None:
+        calculator.pool.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scientific Calculator")
+    parser.add_argument('--eval', metavar='EXPR', action='append',
+                        help="evaluate EXPR and print the result without starting the GUI (repeatable)")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="print the time to first frame and the cost of each startup phase")
+    args = parser.parse_args(argv)
+
+    if args.eval:
+        return run_headless(args.eval)
+    run_gui(profile_startup=args.profile_startup)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+import importlib.util
+import math
+import os
+import unittest
+import warnings
+
+import main
+
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+
+
+@unittest.skipUnless(HAS_NUMPY and main.EvaluationPool.available(), "needs NumPy, fork() and resource")
+class EvaluationPoolMatrixTest(unittest.TestCase):
+    def setUp(self):
+        # Like the GUI process, which leaves all evaluation to the workers and never loads NumPy itself
+        main.np = None
+        self.pool = main.EvaluationPool(size=1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_matrix_result_round_trip(self):
+        result = self.pool.evaluate('[[1,2],[3,4]]^2')
+        self.assertIsInstance(result, main.Matrix)
+        self.assertEqual(result.array.tolist(), [[7.0, 10.0], [15.0, 22.0]])
+        self.assertIn('22.', result.format_view())
+        self.assertEqual(main.format_result(result), '[[7,10],[15,22]]')
+
+    def test_redefine_matrix_variable(self):
+        variables = main.VariableGraph(self.pool.evaluate)
+        variables.define('a', '[[1,2],[3,4]]')
+        variables.define('b', 'det(a)')
+        self.assertEqual(variables.define('a', '[[1,2],[3,4]]'), ['a'])
+        self.assertEqual(variables.define('a', '[[2,0],[0,2]]'), ['a', 'b'])
+        self.assertEqual(variables.values['b'], 4.0)
+
+
+@unittest.skipUnless(main.EvaluationPool.available(), "needs fork() and resource")
+class EvaluationPoolRestartTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = main.EvaluationPool(size=1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_worker_killed_while_idle(self):
+        worker = self.pool._workers[0]
+        worker.process.kill()
+        worker.process.join()
+        self.assertEqual(self.pool.evaluate('1+1'), 2)
+        self.assertEqual(self.pool.stats()['restarts'], 1)
+
+    @unittest.skipUnless(os.path.exists('/proc/self/statm'), "memory limit needs /proc")
+    def test_memory_limit(self):
+        pool = main.EvaluationPool(size=1, memory_limit=64 * 1024 * 1024)
+        self.addCleanup(pool.close)
+        self.assertRaises(MemoryError, pool.evaluate, '2**(8*10**8)')
+        self.assertEqual(pool.evaluate('2+3'), 5)
+
+    def test_cpu_limit(self):
+        pool = main.EvaluationPool(size=1, cpu_limit=1)
+        self.addCleanup(pool.close)
+        self.assertRaises(TimeoutError, pool.evaluate, 'fact(2**40)')
+        self.assertEqual(pool.evaluate('2+3'), 5)
+        self.assertEqual(pool.stats()['restarts'], 1)
+
+
+@unittest.skipUnless(main.EvaluationPool.available(), "needs fork() and resource")
+class EvaluationPoolFactorialCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = main.EvaluationPool(size=2)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def cache_counts(self):
+        stats = self.pool.stats()
+        return stats['factorial_cache_hits'], stats['factorial_cache_misses']
+
+    def test_workers_inherit_table(self):
+        # Table-range factorials are served from the table filled before the workers were forked
+        self.assertEqual(self.pool.evaluate('fact(1000)-fact(999)*1000'), 0)
+        self.assertEqual(self.cache_counts(), (2, 0))
+
+    def test_sequential_requests_reuse_worker(self):
+        self.assertEqual(self.pool.evaluate('fact(3000)'), math.factorial(3000))
+        self.assertEqual(self.cache_counts(), (0, 1))
+        # Served from the cache of the worker that computed it, not recomputed by the other one
+        self.assertEqual(self.pool.evaluate('fact(3000)'), math.factorial(3000))
+        self.assertEqual(self.cache_counts(), (1, 1))
+
+    def test_replaced_worker_starts_with_table(self):
+        pool = main.EvaluationPool(size=1, cpu_limit=1)
+        self.addCleanup(pool.close)
+        self.assertRaises(TimeoutError, pool.evaluate, 'fact(2**40)')
+        self.assertEqual(pool.evaluate('fact(1000)'), math.factorial(1000))
+        self.assertEqual(pool.stats()['factorial_cache_hits'], 1)
+
+
+class ValidateExpressionTest(unittest.TestCase):
+    def test_attribute_access_on_variables_is_rejected(self):
+        variables = {'m': 1, 'array': 1, 'dtype': 1, 'char': 1}
+        for expr in ['m.array.dtype.char', '(m).array', 'math.sqrt.x', 'math.fact(3)']:
+            with self.subTest(expr=expr):
+                ok, message = main.validate_expression(expr, variables)
+                self.assertFalse(ok)
+                self.assertEqual(message, "Error: Disallowed function or variable name")
+
+    def test_math_functions_and_numbers_are_accepted(self):
+        for expr in ['math.sqrt(4)', '2math.pi', '1.e5+.5', '1.5e-3']:
+            with self.subTest(expr=expr):
+                self.assertEqual(main.validate_expression(expr), (True, ""))
+
+
+class EvaluateExpressionTest(unittest.TestCase):
+    def test_top_level_comma_is_rejected(self):
+        for expr in ['1,2', '(1,2)']:
+            with self.subTest(expr=expr):
+                with self.assertRaises(SyntaxError) as context:
+                    main.evaluate_expression(expr)
+                self.assertEqual(main.describe_error(context.exception)[0], "Error: Invalid expression")
+
+    def test_implicit_multiplication(self):
+        cases = {'.5(2)': 1, '.5sqrt(4)': 1, '2.5(2)': 5, '2log10(100)': 4, '1.5e2(2)': 300, '3x+1': 7}
+        for expr, expected in cases.items():
+            with self.subTest(expr=expr):
+                self.assertEqual(main.evaluate_expression(expr, {'x': 2}), expected)
+
+    @unittest.skipUnless(HAS_NUMPY, "needs NumPy")
+    def test_comma_separated_matrices_are_rejected(self):
+        self.assertRaises(SyntaxError, main.evaluate_expression, '[1,2],[3,4]')
+        self.assertEqual(main.evaluate_expression('solve([[2,0],[0,2]],[2,4])').array.tolist(), [1.0, 2.0])
+
+
+@unittest.skipUnless(HAS_NUMPY, "needs NumPy")
+class MatrixLiteralTest(unittest.TestCase):
+    def test_numeric_literals_take_the_fast_path(self):
+        expr, literals = main.extract_matrix_literals('2*[[1,2],[3,4]]+[1.5,-2e3]')
+        self.assertEqual(expr, '2*_m0+_m1')
+        self.assertEqual(literals['_m0'].array.tolist(), [[1.0, 2.0], [3.0, 4.0]])
+        self.assertEqual(literals['_m1'].array.tolist(), [1.5, -2000.0])
+
+    def test_other_literals_fall_back_to_mat(self):
+        expr, literals = main.extract_matrix_literals('[pi,2^3]*[[1,x],[0,1]]')
+        self.assertEqual(expr, 'mat([pi,2^3])*mat([[1,x],[0,1]])')
+        self.assertEqual(literals, {})
+        self.assertEqual(main.format_result(main.evaluate_expression('[pi,2^3]')), '[3.1415926536,8]')
+
+    def test_ragged_rows(self):
+        with self.assertRaises(ValueError) as context:
+            main.evaluate_expression('[[1,2],[3]]')
+        self.assertEqual(main.describe_error(context.exception)[0], "Error: Matrix rows must have the same length")
+
+    def test_unbalanced_brackets(self):
+        for expr in ['[[1,2],[3,4]', '[1,2]]', ']1,2[']:
+            with self.subTest(expr=expr):
+                self.assertRaises(SyntaxError, main.extract_matrix_literals, expr)
+
+    def test_operators(self):
+        cases = {
+            '[[1,2],[3,4]]*[1,1]': '[3,7]',
+            '[[1,2],[3,4]]^2': '[[7,10],[15,22]]',
+            '2*[1,2]-[1,1]': '[1,3]',
+            '[1,2]*[3,4]': '11',
+            'transpose([[1,2],[3,4]])': '[[1,3],[2,4]]',
+            'solve([[2,0],[0,4]],[2,4])': '[1,1]',
+            'det([[1,2],[3,4]])': '-2',
+        }
+        for expr, expected in cases.items():
+            with self.subTest(expr=expr):
+                self.assertEqual(main.format_result(main.evaluate_expression(expr)), expected)
+
+    def test_large_matrix_is_summarised(self):
+        result = main.evaluate_expression('[[' + '],['.join(','.join(['1'] * 5) for _ in range(5)) + ']]')
+        self.assertEqual(main.format_result(result), '[5x5 matrix]')
+
+
+@unittest.skipUnless(HAS_NUMPY, "needs NumPy")
+class MatrixErrorTest(unittest.TestCase):
+    def describe(self, expr):
+        try:
+            main.evaluate_expression(expr)
+        except Exception as e:
+            return main.describe_error(e)[0]
+        self.fail(f"{expr} did not raise")
+
+    def test_singular_matrix(self):
+        self.assertEqual(self.describe('inv([[1,2],[2,4]])'), "Error: Singular matrix")
+
+    def test_determinant_overflow_is_silent(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            self.assertEqual(self.describe('det([[1e200,0],[0,1e200]])'), "Error: Result too large")
+
+    def test_invalid_operations(self):
+        self.assertEqual(self.describe('[[1,2]]^2'), "Error: Matrix power needs a square matrix")
+        self.assertEqual(self.describe('[[1,2],[3,4]]^0.5'), "Error: Matrix power needs an integer exponent")
+        self.assertEqual(self.describe('det([1,2])'), "Error: det() needs a square matrix")
+        self.assertEqual(self.describe('[[1,2],[3,4]]/[1,2]'), "Error: Invalid type for operation")
+        self.assertTrue(self.describe('[1,2]+[1,2,3]').startswith("Error: operands could not be broadcast"))
+
+
+class VariableGraphTest(unittest.TestCase):
+    def test_define_and_recompute_dependents(self):
+        variables = main.VariableGraph()
+        variables.define('a', '3x+1')
+        self.assertEqual(variables.errors['a'], "Error: Undefined variable 'x'")
+        self.assertEqual(variables.define('x', '2'), ['x', 'a'])
+        variables.define('b', 'sqrt(a+2)*2')
+        self.assertEqual(variables.values, {'x': 2, 'a': 7, 'b': 6.0})
+        self.assertEqual(variables.define('x', '1'), ['x', 'a', 'b'])
+        self.assertEqual(variables.describe('b'), 'b = sqrt(a+2)*2 = 4.8989794856')
+
+    def test_early_cutoff(self):
+        evaluated = []
+
+        def evaluate(expr, values):
+            evaluated.append(expr)
+            return main.evaluate_expression(expr, values)
+
+        variables = main.VariableGraph(evaluate)
+        variables.define('x', '-2')
+        variables.define('a', 'abs(x)')
+        variables.define('b', 'a*10')
+        evaluated.clear()
+        # abs(x) is unchanged, so b is not recomputed
+        self.assertEqual(variables.define('x', '2'), ['x', 'a'])
+        self.assertEqual(evaluated, ['2', 'abs(x)'])
+        self.assertEqual(variables.values['b'], 20)
+
+    def test_cycle_leaves_graph_unchanged(self):
+        variables = main.VariableGraph()
+        variables.define('a', '1')
+        variables.define('b', 'a+1')
+        variables.define('c', 'b+1')
+        before = (dict(variables.definitions), dict(variables.values),
+                  {k: set(v) for k, v in variables.dependents.items()})
+        with self.assertRaises(ValueError) as context:
+            variables.define('a', 'c+1')
+        self.assertEqual(str(context.exception), "Circular reference: a -> c -> b -> a")
+        self.assertRaises(ValueError, variables.define, 'a', 'a+1')
+        self.assertEqual((variables.definitions, variables.values,
+                          {k: set(v) for k, v in variables.dependents.items()}), before)
+
+    def test_errored_dependency(self):
+        variables = main.VariableGraph()
+        variables.define('a', '1/0')
+        variables.define('b', 'a+1')
+        self.assertEqual(variables.errors, {'a': "Error: Division by zero", 'b': "Error: 'a' has an error"})
+        self.assertEqual(variables.describe('b'), "b = a+1 = Error: 'a' has an error")
+        variables.define('a', '1')
+        self.assertEqual(variables.errors, {})
+        self.assertEqual(variables.values['b'], 2)
+
+    def test_invalid_definitions(self):
+        variables = main.VariableGraph()
+        self.assertRaises(ValueError, variables.define, 'a', '')
+        self.assertRaises(ValueError, variables.define, 'a', 'import os')
+        self.assertRaises(ValueError, variables.define, 'a', '2$3')
+        self.assertEqual(variables.definitions, {})
+
+    def test_values_for_only_includes_used_variables(self):
+        variables = main.VariableGraph()
+        variables.define('a', '2')
+        variables.define('b', '3')
+        variables.define('c', 'd+1')
+        self.assertEqual(variables.values_for('a*sqrt(4)+c'), {'a': 2})
+        self.assertEqual(variables.values_for('1+1'), {})
+
+    def test_exponent_and_function_names_are_reserved(self):
+        variables = main.VariableGraph()
+        for name in ['e', 'E', 'e2', 'sqrt', 'pi', 'det']:
+            with self.subTest(name=name):
+                self.assertRaises(ValueError, variables.define, name, '1')
+        self.assertEqual(variables.define('ex', '1'), ['ex'])
+
+
+class ParseAssignmentTest(unittest.TestCase):
+    def test_assignments(self):
+        self.assertEqual(main.parse_assignment('a = 3x+1'), ('a', '3x+1'))
+        self.assertEqual(main.parse_assignment('  b2=sqrt(a)*pi  '), ('b2', 'sqrt(a)*pi'))
+        self.assertEqual(main.parse_assignment('c ='), ('c', ''))
+
+    def test_not_assignments(self):
+        for text in ['3x+1', '2=3', '_a = 1', '= 4', '']:
+            with self.subTest(text=text):
+                self.assertIsNone(main.parse_assignment(text))
+
+
+class FactorialQuotientRewriteTest(unittest.TestCase):
+    def test_whole_operand_is_rewritten(self):
+        self.assertEqual(main.prepare_expression('fact(10)/(fact(3)*fact(7))')[0], 'fact_quotient(10,3,7)')
+        self.assertEqual(main.prepare_expression('1-fact(5)/fact(3)')[0], '1-fact_quotient(5,3)')
+        self.assertEqual(main.prepare_expression('-fact(5)/fact(3)')[0], '-fact_quotient(5,3)')
+
+    def test_divisor_or_exponent_is_left_alone(self):
+        for expr in ['2^-fact(3)/fact(2)', '2^fact(3)/fact(2)', '8/-fact(3)/fact(2)',
+                     '(5)%fact(3)/fact(2)', 'fact(3)/fact(2)^2']:
+            with self.subTest(expr=expr):
+                self.assertNotIn('fact_quotient', main.prepare_expression(expr)[0])
+
+    def test_wrong_argument_count_is_left_to_fact(self):
+        for expr in ['fact(5,1)/fact(3)', 'fact(5)/fact(3,1)', 'fact(3)/fact()', 'fact(6)/(fact(2)*fact(4,1))']:
+            with self.subTest(expr=expr):
+                self.assertNotIn('fact_quotient', main.prepare_expression(expr)[0])
+                self.assertRaises(TypeError, main.evaluate_expression, expr)
+
+    def test_precedence_after_unary_sign(self):
+        self.assertEqual(main.evaluate_expression('2^-fact(3)/fact(2)'), 0.0078125)
+        self.assertAlmostEqual(main.evaluate_expression('2^-fact(4)/(fact(2)*fact(2))'), 2 ** -24 / 4)
+
+    def test_matches_plain_division(self):
+        f = math.factorial
+        cases = {
+            'fact(20)/(fact(6)*fact(14))': f(20) // (f(6) * f(14)),
+            '3+fact(9)/fact(4)*2': 3 + f(9) // f(4) * 2,
+            'fact(3)/fact(5)': f(3) / f(5),
+            'fact(4)/(fact(3)*fact(3))': f(4) / (f(3) * f(3)),
+        }
+        for expr, expected in cases.items():
+            with self.subTest(expr=expr):
+                self.assertEqual(main.evaluate_expression(expr), expected)
+
+
+class SpecialFunctionsTest(unittest.TestCase):
+    def test_fact_matches_math_factorial(self):
+        special = main.SpecialFunctions()
+        for n in [0, 1, 5, 170, main.FACTORIAL_TABLE_LIMIT, 1500, 1800, 1500]:
+            with self.subTest(n=n):
+                self.assertEqual(special.fact(n), math.factorial(n))
+        self.assertEqual(len(special.table), main.FACTORIAL_TABLE_LIMIT + 1)
+        self.assertIn(1500, special.cache)
+
+    def test_hit_and_miss_counters(self):
+        special = main.SpecialFunctions()
+        special.fact(10)
+        special.fact(10)
+        special.fact(2000)
+        special.fact(2000)
+        self.assertEqual((special.hits, special.misses), (2, 2))
+
+    def test_fact_rejects_bad_arguments(self):
+        special = main.SpecialFunctions()
+        self.assertRaises(ValueError, special.fact, -1)
+        self.assertRaises(ValueError, special.fact, 2.5)
+        self.assertEqual(special.fact(5.0), 120)
+
+    def test_cache_stays_within_byte_limit(self):
+        special = main.SpecialFunctions(max_cache_bytes=4096)
+        for n in range(1001, 1040):
+            special.fact(n)
+        self.assertLessEqual(special.cache_bytes, 4096)
+        self.assertEqual(special.cache_bytes, sum((v.bit_length() + 7) // 8 for v in special.cache.values()))
+        self.assertIn(1039, special.cache)
+        self.assertNotIn(1001, special.cache)
+
+    def test_fact_quotient_is_exact(self):
+        special = main.SpecialFunctions()
+        self.assertEqual(special.fact_quotient(3000, 2999), 3000)
+        self.assertEqual(special.fact_quotient(5000, 2, 4998), 5000 * 4999 // 2)
+        self.assertIsInstance(special.fact_quotient(5000, 2, 4998), int)
+        self.assertEqual(special.fact_quotient(2, 3), 1 / 3)
+
+
+if __name__ == '__main__':
+    unittest.main()